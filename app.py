@@ -1,37 +1,78 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request
 import os
-import json
-from datetime import datetime
-from open_meteo_client import fetch_weather_data
-from gcs_client import upload_to_gcs, list_gcs_files, get_gcs_file_content
+import re
+import calendar
+import fastjsonschema
+import json_codec
+from open_meteo_client import fetch_weather_data, is_range_final
+from gcs_client import upload_to_gcs, get_gcs_file_updated, list_gcs_files, stream_gcs_file_names, get_gcs_file_bytes
 
 app = Flask(__name__)
 
 GCS_BUCKET_NAME = os.environ.get("GCS_BUCKET_NAME")
 
+_DATE_RE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})')
+# Cache-Control stored with each weather file and served by weather_file_content_endpoint.
+# Files written once their range had settled are never rewritten (see store_weather_data_endpoint);
+# any other file may still be overwritten and is revalidated through its ETag.
+_FINAL_FILE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+_FILE_CACHE_CONTROL = 'public, max-age=600'
+
+# Compiled once at import; checks presence, types and ranges of the request fields.
+# Whether a date exists on the calendar is still checked by validate_date_format.
+_validate_store_request = fastjsonschema.compile({
+    "type": "object",
+    "required": ["latitude", "longitude", "start_date", "end_date"],
+    "properties": {
+        "latitude": {"type": "number", "minimum": -90, "maximum": 90},
+        "longitude": {"type": "number", "minimum": -180, "maximum": 180},
+        "start_date": {"type": "string", "pattern": "^[0-9]{4}-[0-9]{2}-[0-9]{2}$"},
+        "end_date": {"type": "string", "pattern": "^[0-9]{4}-[0-9]{2}-[0-9]{2}$"},
+    },
+})
+
 def generate_filename(latitude, longitude, start_date_str, end_date_str):
     """Generates a standardized filename for the weather data."""
-    start_date_fn = start_date_str.replace("-", "")
-    end_date_fn = end_date_str.replace("-", "")
-    lat_str = f"{latitude:.2f}".replace('.', '_')
-    lon_str = f"{longitude:.2f}".replace('.', '_')
-    return f"weather_lat{lat_str}_lon{lon_str}_from{start_date_fn}_to{end_date_fn}.json"
+    return "weather_lat%s_lon%s_from%s_to%s.json" % (
+        ("%.2f" % latitude).replace('.', '_'),
+        ("%.2f" % longitude).replace('.', '_'),
+        start_date_str.replace('-', ''),
+        end_date_str.replace('-', ''),
+    )
 
 def validate_date_format(date_str):
-    """Validates if the date string is in YYYY-MM-DD format."""
-    try:
-        datetime.strptime(date_str, '%Y-%m-%d')
-        return True
-    except ValueError:
+    """Validates if the date string is in YYYY-MM-DD format and is a real calendar date."""
+    m = _DATE_RE.fullmatch(date_str)
+    if not m:
         return False
+    year, month, day = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    return year >= 1 and 1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]
+
+def _json_response(obj, status=200):
+    """Builds a JSON response serialized with json_codec instead of Flask's jsonify."""
+    return app.response_class(json_codec.dumps(obj), status=status, mimetype='application/json')
+
+@app.after_request
+def add_cache_headers(response):
+    """Lets clients and intermediate caches reuse successful buffered file listings for a short time."""
+    if request.endpoint == 'list_weather_files_endpoint':
+        # JSON or NDJSON is chosen from the Accept header, so caches must key on it
+        response.vary.add('Accept')
+        if response.mimetype == 'application/x-ndjson':
+            # Headers go out before the stream ends, so a listing that ends in a
+            # truncation error record must never be stored by a cache.
+            response.headers['Cache-Control'] = 'no-store'
+        elif request.method == 'GET' and response.status_code in (200, 304):
+            response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
 
 # --- API Endpoints ---
 
 @app.route('/')
 def index():
     """A simple index route to check if the app is running."""
-    return jsonify({"message": "Welcome to the Weather Data Service API!"}), 200
+    return _json_response({"message": "Welcome to the Weather Data Service API!"}, 200)
 
 @app.route('/store-weather-data', methods=['POST'])
 def store_weather_data_endpoint():
@@ -41,71 +82,110 @@ def store_weather_data_endpoint():
     """
     if not GCS_BUCKET_NAME:
         app.logger.error("GCS_BUCKET_NAME not configured on the server.")
-        return jsonify({"error": "Server configuration error: GCS bucket not set."}), 500
+        return _json_response({"error": "Server configuration error: GCS bucket not set."}, 500)
 
+    # Parse the raw body with json_codec rather than request.get_json(); cache=False
+    # keeps Flask from holding on to a second copy of the body.
+    raw_body = request.get_data(cache=False)
+    if not raw_body:
+        return _json_response({"error": "Invalid request: No JSON payload received."}, 400)
     try:
-        req_data = request.get_json()
-        if not req_data:
-            return jsonify({"error": "Invalid request: No JSON payload received."}), 400
-    except Exception as e: # Catches errors if request body is not valid JSON
+        req_data = json_codec.loads(raw_body)
+    except json_codec.JSONDecodeError as e: # Request body is not valid JSON
         app.logger.error(f"Failed to parse request JSON: {e}")
-        return jsonify({"error": "Invalid request: Malformed JSON."}), 400
+        return _json_response({"error": "Invalid request: Malformed JSON."}, 400)
+    if not req_data:
+        return _json_response({"error": "Invalid request: No JSON payload received."}, 400)
+
+    try:
+        _validate_store_request(req_data)
+    except fastjsonschema.JsonSchemaException as e:
+        return _json_response({"error": f"Invalid request: {e.message}"}, 400)
 
-    latitude = req_data.get('latitude')
-    longitude = req_data.get('longitude')
-    start_date = req_data.get('start_date')
-    end_date = req_data.get('end_date')
+    latitude = req_data['latitude']
+    longitude = req_data['longitude']
+    start_date = req_data['start_date']
+    end_date = req_data['end_date']
 
-    required_params = {"latitude": latitude, "longitude": longitude, "start_date": start_date, "end_date": end_date}
-    missing_params = [key for key, value in required_params.items() if value is None]
-    if missing_params:
-        return jsonify({"error": f"Missing parameters: {', '.join(missing_params)}"}), 400
+    if not (validate_date_format(start_date) and validate_date_format(end_date)):
+        return _json_response({"error": "Invalid date format for start_date or end_date. Use YYYY-MM-DD."}, 400)
 
-    if not (isinstance(latitude, (int, float)) and isinstance(longitude, (int, float))):
-        return jsonify({"error": "Invalid data type for latitude or longitude. Must be float or integer."}), 400
+    file_name = generate_filename(latitude, longitude, start_date, end_date)
 
-    if not (isinstance(start_date, str) and validate_date_format(start_date) and
-            isinstance(end_date, str) and validate_date_format(end_date)):
-        return jsonify({"error": "Invalid date format for start_date or end_date. Use YYYY-MM-DD."}), 400
+    # An existing file written after its range had settled holds final archive data,
+    # so it is returned without refetching. Older files may hold incomplete recent
+    # days and are refetched and overwritten.
+    stored_at = get_gcs_file_updated(GCS_BUCKET_NAME, file_name)
+    if stored_at is not None and is_range_final(end_date, as_of=stored_at):
+        app.logger.info(f"File already stored: gs://{GCS_BUCKET_NAME}/{file_name}")
+        return _json_response({
+            "message": "Weather data already stored.",
+            "file_name": file_name,
+            "gcs_path": f"gs://{GCS_BUCKET_NAME}/{file_name}",
+            "cached": True
+        }, 200)
 
     app.logger.info(f"Fetching weather data for {latitude}, {longitude} from {start_date} to {end_date}")
     weather_api_data = fetch_weather_data(latitude, longitude, start_date, end_date)
 
     if weather_api_data is None:
         app.logger.error("Failed to fetch weather data from Open-Meteo.")
-        return jsonify({"error": "Failed to fetch weather data from external API."}), 502 # Bad Gateway
+        return _json_response({"error": "Failed to fetch weather data from external API."}, 502) # Bad Gateway
 
-    file_name = generate_filename(latitude, longitude, start_date, end_date)
-    weather_data_json_string = json.dumps(weather_api_data, indent=2) # Pretty print for stored JSON
+    weather_data_bytes = json_codec.dumps(weather_api_data) # Compact JSON; the stored file is machine-read
 
     app.logger.info(f"Uploading data to GCS: gs://{GCS_BUCKET_NAME}/{file_name}")
-    if upload_to_gcs(GCS_BUCKET_NAME, file_name, weather_data_json_string):
-        return jsonify({
+    cache_control = _FINAL_FILE_CACHE_CONTROL if is_range_final(end_date) else _FILE_CACHE_CONTROL
+    if upload_to_gcs(GCS_BUCKET_NAME, file_name, weather_data_bytes, cache_control=cache_control):
+        return _json_response({
             "message": "Weather data fetched and stored successfully.",
             "file_name": file_name,
             "gcs_path": f"gs://{GCS_BUCKET_NAME}/{file_name}"
-        }), 201 # 201 Created
+        }, 201) # 201 Created
     else:
         app.logger.error(f"Failed to upload data to GCS bucket '{GCS_BUCKET_NAME}'.")
-        return jsonify({"error": "Failed to store weather data in GCS."}), 500
+        return _json_response({"error": "Failed to store weather data in GCS."}, 500)
 
 
 @app.route('/list-weather-files', methods=['GET'])
 def list_weather_files_endpoint():
-    """Endpoint to list all weather data files stored in the GCS bucket."""
+    """
+    Endpoint to list all weather data files stored in the GCS bucket.
+    Clients sending "Accept: application/x-ndjson" get a stream with one JSON object
+    per file, which starts before the full listing has been fetched.
+    """
     if not GCS_BUCKET_NAME:
         app.logger.error("GCS_BUCKET_NAME not configured on the server.")
-        return jsonify({"error": "Server configuration error: GCS bucket not set."}), 500
+        return _json_response({"error": "Server configuration error: GCS bucket not set."}, 500)
 
     file_prefix = "weather_"
     app.logger.info(f"Listing files from GCS bucket '{GCS_BUCKET_NAME}' with prefix '{file_prefix}'")
+
+    if request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        names = stream_gcs_file_names(GCS_BUCKET_NAME, prefix=file_prefix)
+        if names is None:
+            app.logger.error(f"Failed to retrieve file list from GCS bucket '{GCS_BUCKET_NAME}'.")
+            return _json_response({"error": "Failed to retrieve file list from GCS."}, 500)
+
+        def generate_lines():
+            try:
+                for name in names:
+                    yield json_codec.dumps({"file_name": name}) + b"\n"
+            except Exception as e:
+                # The 200 status is already sent, so end with an error record that
+                # lets clients tell the listing is incomplete.
+                app.logger.error(f"File listing from GCS bucket '{GCS_BUCKET_NAME}' was truncated: {e}")
+                yield json_codec.dumps({"error": "Listing truncated: failed to retrieve the full file list from GCS."}) + b"\n"
+
+        return app.response_class(generate_lines(), status=200, mimetype='application/x-ndjson')
+
     files = list_gcs_files(GCS_BUCKET_NAME, prefix=file_prefix)
 
     if files is None: # list_gcs_files returns None on error
         app.logger.error(f"Failed to retrieve file list from GCS bucket '{GCS_BUCKET_NAME}'.")
-        return jsonify({"error": "Failed to retrieve file list from GCS."}), 500
+        return _json_response({"error": "Failed to retrieve file list from GCS."}, 500)
 
-    return jsonify({"files": files, "bucket": GCS_BUCKET_NAME}), 200
+    return _json_response({"files": files, "bucket": GCS_BUCKET_NAME}, 200)
 
 
 @app.route('/weather-file-content/<path:file_name>', methods=['GET'])
@@ -113,21 +193,43 @@ def weather_file_content_endpoint(file_name):
     """
     Endpoint to fetch and display the content of a specific JSON file from GCS.
     <path:file_name> allows filenames to contain slashes (if they are in "subfolders").
+    The ETag is the GCS object generation; a matching If-None-Match returns 304
+    without downloading the file content.
     """
     if not GCS_BUCKET_NAME:
         app.logger.error("GCS_BUCKET_NAME not configured on the server.")
-        return jsonify({"error": "Server configuration error: GCS bucket not set."}), 500
+        return _json_response({"error": "Server configuration error: GCS bucket not set."}, 500)
 
     if not file_name:
-        return jsonify({"error": "File name cannot be empty."}), 400
+        return _json_response({"error": "File name cannot be empty."}, 400)
+
+    # A single strong ETag from a previous response is passed to GCS as a generation precondition
+    known_etags = request.if_none_match.as_set()
+    known_generation = None
+    if len(known_etags) == 1:
+        etag = next(iter(known_etags))
+        if etag.isdigit():
+            known_generation = int(etag)
 
     app.logger.info(f"Fetching content for file 'gs://{GCS_BUCKET_NAME}/{file_name}'")
-    content = get_gcs_file_content(GCS_BUCKET_NAME, file_name)
+    # The stored files are JSON written by this service, so the bytes are returned
+    # as-is rather than parsed and re-serialized.
+    result = get_gcs_file_bytes(GCS_BUCKET_NAME, file_name, if_generation_not_match=known_generation)
 
-    if content is None:
-        return jsonify({"error": f"File '{file_name}' not found or unable to retrieve/parse content."}), 404
+    if result is None:
+        return _json_response({"error": f"File '{file_name}' not found or unable to retrieve content."}, 404)
 
-    return jsonify(content), 200
+    content, generation, cache_control = result
+    if content is None: # Unchanged since the client's copy
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(content, status=200, mimetype='application/json')
+    if generation is not None:
+        response.set_etag(str(generation))
+    # The Cache-Control chosen when the file was stored; files stored without one
+    # (and 304s, which carry no metadata) get the short revalidating default.
+    response.headers['Cache-Control'] = cache_control or _FILE_CACHE_CONTROL
+    return response
 
 if __name__ == '__main__':
     if not GCS_BUCKET_NAME:
@@ -1,30 +1,51 @@
 # gcs_client.py
 from google.cloud import storage
 from google.cloud.exceptions import NotFound, Forbidden
-import json
+from google.api_core.exceptions import NotModified
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from functools import lru_cache
+import json_codec
 import os # To get environment variables
 
+# Only blob names are needed when listing, so ask GCS to omit ACLs and other
+# metadata from each page of results.
+_LIST_FIELDS = "items(name),nextPageToken"
+
 # It's good practice to initialize the client once, potentially outside functions
 # if it's going to be used by multiple functions in the same module/application.
 # When running locally, it uses Application Default Credentials (ADC).
 # When running on GCP services (like Cloud Run, Cloud Functions), it uses the
 # service account associated with that resource by default.
+# The client gets its own HTTP session with a larger connection pool than the
+# default 10, so concurrent gevent requests do not queue for a free connection.
 try:
-    storage_client = storage.Client()
+    credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+    http_session = AuthorizedSession(credentials)
+    http_session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=128))
+    storage_client = storage.Client(project=project, credentials=credentials, _http=http_session)
 except Exception as e:
     print(f"Critical Error: Could not initialize Google Cloud Storage client: {e}")
     print("Ensure you have run 'gcloud auth application-default login' or "
           "that the environment is correctly configured for GCP authentication.")
     storage_client = None # Set to None so later functions can check
 
-def upload_to_gcs(bucket_name, destination_blob_name, data_json_string):
+@lru_cache(maxsize=None)
+def _get_bucket(bucket_name):
+    """Returns a Bucket handle for bucket_name, reused across calls."""
+    return storage_client.bucket(bucket_name)
+
+def upload_to_gcs(bucket_name, destination_blob_name, data_bytes, cache_control=None):
     """
-    Uploads a string of JSON data to the specified GCS bucket.
+    Uploads serialized JSON data to the specified GCS bucket.
 
     Args:
         bucket_name (str): The name of the GCS bucket.
         destination_blob_name (str): The desired name for the file in GCS (e.g., "data/my_file.json").
-        data_json_string (str): The JSON data as a string.
+        data_bytes (bytes): The UTF-8 encoded JSON data.
+        cache_control (str, optional): Cache-Control value stored in the blob's metadata
+            and returned with its downloads. Defaults to None (not set).
 
     Returns:
         bool: True if upload was successful, False otherwise.
@@ -34,12 +55,18 @@ def upload_to_gcs(bucket_name, destination_blob_name, data_json_string):
         return False
 
     try:
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(destination_blob_name)
-
+        bucket = _get_bucket(bucket_name)
+        # Weather files are only a few KB, so pin chunk_size to None: the payload goes
+        # out in a single multipart request instead of a chunked resumable upload.
+        blob = bucket.blob(destination_blob_name, chunk_size=None)
+        blob.cache_control = cache_control
+
+        # Passing bytes skips the client's str -> UTF-8 encode step; the library wraps
+        # them in a BytesIO itself, so upload_from_file would not save a copy.
         blob.upload_from_string(
-            data_json_string,
-            content_type='application/json' # Set the content type for proper handling
+            data_bytes,
+            content_type='application/json', # Set the content type for proper handling
+            checksum=None # Small payload over TLS; skip the extra MD5/CRC32C pass
         )
         print(f"Data successfully uploaded to gs://{bucket_name}/{destination_blob_name}")
         return True
@@ -53,6 +80,34 @@ def upload_to_gcs(bucket_name, destination_blob_name, data_json_string):
         print(f"An unexpected error occurred during GCS upload: {e}")
         return False
 
+def get_gcs_file_updated(bucket_name, blob_name):
+    """
+    Fetches the last modification time of a blob in the specified GCS bucket.
+
+    Args:
+        bucket_name (str): The name of the GCS bucket.
+        blob_name (str): The name of the blob (file) to check.
+
+    Returns:
+        datetime: When the blob was last written (timezone-aware, UTC).
+                  Returns None if the blob does not exist or the lookup fails,
+                  so callers fall back to treating the file as missing.
+    """
+    if not storage_client:
+        print("GCS client not initialized. Cannot check file metadata.")
+        return None
+
+    try:
+        bucket = _get_bucket(bucket_name)
+        blob = bucket.get_blob(blob_name)
+        return blob.updated if blob is not None else None
+    except Forbidden as e:
+        print(f"Error: Permission denied for checking file 'gs://{bucket_name}/{blob_name}'. Details: {e}")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred while checking GCS file metadata: {e}")
+        return None
+
 def list_gcs_files(bucket_name, prefix=None):
     """
     Lists all blobs (files) in the specified GCS bucket, optionally filtered by a prefix.
@@ -69,7 +124,7 @@ def list_gcs_files(bucket_name, prefix=None):
         return None
 
     try:
-        blobs = storage_client.list_blobs(bucket_name, prefix=prefix)
+        blobs = storage_client.list_blobs(bucket_name, prefix=prefix, fields=_LIST_FIELDS)
         file_names = [blob.name for blob in blobs]
         print(f"Found {len(file_names)} files in gs://{bucket_name}/" + (f" with prefix '{prefix}'" if prefix else ""))
         return file_names
@@ -83,56 +138,127 @@ def list_gcs_files(bucket_name, prefix=None):
         print(f"An unexpected error occurred while listing GCS files: {e}")
         return None
 
-def get_gcs_file_content(bucket_name, blob_name):
+def stream_gcs_file_names(bucket_name, prefix=None):
     """
-    Fetches the content of a specific blob from GCS and parses it as JSON.
+    Lists blob names page by page, for streaming large listings without building the full list.
+
+    The first page is fetched before returning, so a missing bucket or denied permission
+    is reported as None just like list_gcs_files. Later pages are fetched lazily;
+    an error on one of them is re-raised from the generator, so the caller can tell
+    a truncated listing from a complete one.
 
     Args:
         bucket_name (str): The name of the GCS bucket.
-        blob_name (str): The name of the blob (file) to retrieve.
+        prefix (str, optional): A prefix to filter blob names. Defaults to None (list all).
 
     Returns:
-        dict/list: The parsed JSON content if successful and the file is valid JSON.
-                   Returns None if the file is not found, permission is denied,
-                   the content is not valid JSON, or another error occurs.
+        generator: Yields blob names (strings) if the listing started successfully,
+                   or None if an error occurs.
     """
     if not storage_client:
-        print("GCS client not initialized. Cannot get file content.")
+        print("GCS client not initialized. Cannot list files.")
         return None
 
     try:
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_name)
+        pages = storage_client.list_blobs(bucket_name, prefix=prefix, fields=_LIST_FIELDS).pages
+        first_page = [blob.name for blob in next(pages, [])]
+    except NotFound:
+        print(f"Error: Bucket '{bucket_name}' not found.")
+        return None
+    except Forbidden as e:
+        print(f"Error: Permission denied for listing blobs in bucket '{bucket_name}'. Details: {e}")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred while listing GCS files: {e}")
+        return None
 
-        if not blob.exists():
-            print(f"Error: File 'gs://{bucket_name}/{blob_name}' not found.")
-            return None
+    def generate_names():
+        yield from first_page
+        try:
+            for page in pages:
+                for blob in page:
+                    yield blob.name
+        except Exception as e:
+            print(f"An unexpected error occurred while listing GCS files: {e}")
+            raise
 
-        # Download content as string (text). The client library handles decoding based on content type
-        # or defaults to UTF-8.
-        content_string = blob.download_as_text()
+    return generate_names()
 
-        # Parse the string content as JSON
-        json_content = json.loads(content_string)
-        print(f"Successfully retrieved and parsed content from gs://{bucket_name}/{blob_name}")
-        return json_content
+def get_gcs_file_bytes(bucket_name, blob_name, if_generation_not_match=None):
+    """
+    Fetches the raw content of a specific blob from GCS without parsing it.
+
+    Args:
+        bucket_name (str): The name of the GCS bucket.
+        blob_name (str): The name of the blob (file) to retrieve.
+        if_generation_not_match (int, optional): Generation the caller already has.
+            If the blob is still at this generation, GCS answers without sending the content.
+
+    Returns:
+        tuple: (content, generation, cache_control) if successful, where content is the
+               blob's bytes, generation its generation number and cache_control the
+               Cache-Control stored with it (either may be None if not reported).
+               content and cache_control are None when the blob is unchanged from
+               if_generation_not_match.
+               Returns None if the file is not found, permission is denied,
+               or another error occurs.
+    """
+    if not storage_client:
+        print("GCS client not initialized. Cannot get file content.")
+        return None
 
-    except NotFound: # This specific NotFound for blob.exists() is already handled above.
-                    # This would catch if bucket itself was not found during blob.exists() indirectly,
-                    # but the bucket specific NotFound is better caught earlier if possible.
+    try:
+        bucket = _get_bucket(bucket_name)
+        blob = bucket.blob(blob_name, chunk_size=None) # Single-request download
+
+        # A missing file raises NotFound here, so no separate exists() round trip
+        # is needed. Checksum validation is skipped for these small files; TLS
+        # already protects the transfer.
+        raw = blob.download_as_bytes(checksum=None, if_generation_not_match=if_generation_not_match)
+        print(f"Successfully retrieved content from gs://{bucket_name}/{blob_name}")
+        # Generation and Cache-Control are read from the download response headers
+        return raw, blob.generation, blob.cache_control
+
+    except NotModified:
+        print(f"File gs://{bucket_name}/{blob_name} unchanged since generation {if_generation_not_match}")
+        return None, if_generation_not_match, None
+    except NotFound:
         print(f"Error: Bucket '{bucket_name}' or file '{blob_name}' not found during download operation.")
         return None
     except Forbidden as e:
         print(f"Error: Permission denied for reading file 'gs://{bucket_name}/{blob_name}'. Details: {e}")
         return None
-    except json.JSONDecodeError:
-        print(f"Error: Content of 'gs://{bucket_name}/{blob_name}' is not valid JSON.")
-        # print(f"Raw content was: {content_string}") # Uncomment for debugging if needed
-        return None
     except Exception as e:
         print(f"An unexpected error occurred while retrieving GCS file content: {e}")
         return None
 
+def get_gcs_file_content(bucket_name, blob_name):
+    """
+    Fetches the content of a specific blob from GCS and parses it as JSON.
+
+    Args:
+        bucket_name (str): The name of the GCS bucket.
+        blob_name (str): The name of the blob (file) to retrieve.
+
+    Returns:
+        dict/list: The parsed JSON content if successful and the file is valid JSON.
+                   Returns None if the file is not found, permission is denied,
+                   the content is not valid JSON, or another error occurs.
+    """
+    result = get_gcs_file_bytes(bucket_name, blob_name)
+    if result is None:
+        return None
+    raw = result[0]
+
+    try:
+        # json_codec parses UTF-8 bytes directly, so there is no need to decode
+        # into an intermediate str first.
+        return json_codec.loads(raw)
+    except json_codec.JSONDecodeError:
+        print(f"Error: Content of 'gs://{bucket_name}/{blob_name}' is not valid JSON.")
+        # print(f"Raw content was: {raw}") # Uncomment for debugging if needed
+        return None
+
 # This block will only run if the script is executed directly
 if __name__ == "__main__":
     print("Testing GCS client...")
@@ -155,11 +281,11 @@ if __name__ == "__main__":
         # --- Test 1: Upload a file ---
         print("\n--- Test Upload ---")
         sample_data_to_upload = {"city": "Testville", "temperature": 25.5, "conditions": "sunny"}
-        # Convert Python dict to JSON string
-        sample_json_string = json.dumps(sample_data_to_upload, indent=2)
+        # Convert Python dict to JSON bytes
+        sample_json_bytes = json_codec.dumps(sample_data_to_upload, pretty=True)
         test_file_name_1 = "test_data/sample_weather_1.json"
 
-        if upload_to_gcs(TEST_BUCKET_NAME, test_file_name_1, sample_json_string):
+        if upload_to_gcs(TEST_BUCKET_NAME, test_file_name_1, sample_json_bytes):
             print(f"Upload test for '{test_file_name_1}' seems successful (check GCS console).")
         else:
             print(f"Upload test for '{test_file_name_1}' failed.")
@@ -167,10 +293,10 @@ if __name__ == "__main__":
         # Upload another file for listing tests
         sample_data_to_upload_2 = {"city": "Cloudburg", "data_points": [1,2,3]}
         test_file_name_2 = "test_data/sample_weather_2.json"
-        upload_to_gcs(TEST_BUCKET_NAME, test_file_name_2, json.dumps(sample_data_to_upload_2))
+        upload_to_gcs(TEST_BUCKET_NAME, test_file_name_2, json_codec.dumps(sample_data_to_upload_2))
 
         other_test_file = "other_stuff/notes.txt"
-        upload_to_gcs(TEST_BUCKET_NAME, other_test_file, "This is not JSON.")
+        upload_to_gcs(TEST_BUCKET_NAME, other_test_file, b"This is not JSON.")
 
 
         # --- Test 2: List files (all and with prefix) ---
@@ -194,7 +320,7 @@ if __name__ == "__main__":
             content = get_gcs_file_content(TEST_BUCKET_NAME, test_file_name_1)
             if content:
                 print(f"Content of '{test_file_name_1}':")
-                print(json.dumps(content, indent=2)) # Print retrieved content
+                print(json_codec.dumps(content, pretty=True).decode()) # Print retrieved content
                 # Basic check
                 if content.get("city") == "Testville":
                     print("Content check passed for Testville data.")
@@ -227,7 +353,7 @@ if __name__ == "__main__":
         # --- Test 6: Operations on a non-existent bucket (Optional, harder to fully automate without creating/deleting buckets) ---
         # print("\n--- Test Operations on Non-Existent Bucket ---")
         # non_existent_bucket = "this-bucket-surely-does-not-exist-gcs-client-test"
-        # if not upload_to_gcs(non_existent_bucket, "test.json", "{}"):
+        # if not upload_to_gcs(non_existent_bucket, "test.json", b"{}"):
         #     print("Correctly failed to upload to non-existent bucket.")
         # if list_gcs_files(non_existent_bucket) is None:
         #     print("Correctly failed to list from non-existent bucket.")
@@ -0,0 +1,37 @@
+# json_codec.py
+# JSON encoding/decoding used by the app and the GCS client.
+# Prefers orjson, falls back to ujson, then to the standard library, so the
+# service still runs where orjson cannot be installed. All backends produce
+# UTF-8 encoded bytes, which is what GCS uploads and Flask responses take.
+
+try:
+    import orjson as _json
+
+    BACKEND = "orjson"
+    JSONDecodeError = _json.JSONDecodeError
+
+    def dumps(obj, pretty=False):
+        """Serializes obj to compact (or 2-space indented) JSON bytes."""
+        return _json.dumps(obj, option=_json.OPT_INDENT_2 if pretty else None)
+
+    loads = _json.loads
+except ImportError:
+    try:
+        import ujson as _json
+        BACKEND = "ujson"
+        _dumps_kwargs = {"ensure_ascii": False, "escape_forward_slashes": False}
+    except ImportError:
+        import json as _json
+        BACKEND = "json"
+        _dumps_kwargs = {"ensure_ascii": False, "separators": (",", ":")}
+
+    # Both fallbacks raise ValueError subclasses on malformed (or non UTF-8) input.
+    JSONDecodeError = ValueError
+
+    def dumps(obj, pretty=False):
+        """Serializes obj to compact (or 2-space indented) JSON bytes."""
+        if pretty:
+            return _json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+        return _json.dumps(obj, **_dumps_kwargs).encode("utf-8")
+
+    loads = _json.loads
@@ -1,9 +1,26 @@
-import requests
+import httpx
 
 import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import urlencode
 
 BASE_URL = "https://archive-api.open-meteo.com/v1/archive"
 
+# Shared HTTP/2 client: one TLS session to Open-Meteo is kept alive and multiplexes
+# concurrent requests instead of opening a new connection per call.
+# Connection failures are retried by the transport.
+_CLIENT = httpx.Client(
+    timeout=httpx.Timeout(10.0, connect=3.0),
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+    ),
+)
+
 DAILY_VARIABLES = [
     "temperature_2m_max",
     "temperature_2m_min",
@@ -13,10 +30,54 @@ DAILY_VARIABLES = [
     "apparent_temperature_mean",
 ]
 
+def _build_static_query(daily_variables):
+    """URL-encodes the query parameters that are the same for every request."""
+    return urlencode({"daily": ",".join(daily_variables), "timezone": "GMT"})
+
+# Built once at import; only the location and dates are added per request.
+_STATIC_QUERY = _build_static_query(DAILY_VARIABLES)
+
+# The archive publishes recent days with a lag of several days and may revise them
+# meanwhile, so data is only treated as final this many days after the range ends.
+ARCHIVE_SETTLING_DAYS = 7
+
+def is_range_final(end_date, as_of=None):
+    """
+    Checks whether archive data for a range ending on end_date was final at a given time.
+
+    Args:
+        end_date (str): End date of the range (YYYY-MM-DD).
+        as_of (datetime, optional): When the data was (or would be) fetched, e.g. a
+            stored file's update time. Defaults to now.
+
+    Returns:
+        bool: True if as_of is more than ARCHIVE_SETTLING_DAYS days after end_date (GMT).
+              False otherwise, including when end_date is not a valid date.
+    """
+    try:
+        end = date.fromisoformat(end_date)
+    except (TypeError, ValueError):
+        return False
+    as_of = as_of or datetime.now(timezone.utc)
+    return as_of.astimezone(timezone.utc).date() > end + timedelta(days=ARCHIVE_SETTLING_DAYS)
+
+# In-process LRU cache of successful responses, keyed by the rounded request URL.
+# Entries for ranges that are final (see is_range_final) never expire; more recent
+# ranges may still be filled in and are only kept for RECENT_RANGE_TTL_SECONDS.
+CACHE_MAXSIZE = 1024
+RECENT_RANGE_TTL_SECONDS = 3600
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
 def fetch_weather_data(latitude, longitude, start_date, end_date): # Corrected typo: latitute -> latitude
     """"
       Fetches historical weather data from the Open-Meteo API.
 
+    Coordinates are rounded to 2 decimals (the precision used in stored file names),
+    and successful responses are served from an in-process cache on repeat calls.
+    Inputs should be validated by the caller before calling this function.
+
     Args:
         latitude (float): Latitude of the location.
         longitude (float): Longitude of the location.
@@ -25,38 +86,55 @@ def fetch_weather_data(latitude, longitude, start_date, end_date): # Corrected t
 
     Returns:
         dict: A dictionary containing the weather data if successful,
-              None otherwise.
+              None otherwise. The dictionary may be shared with the cache
+              and must not be modified.
     """
+    url = (f"{BASE_URL}?{_STATIC_QUERY}&latitude={round(latitude, 2)}&longitude={round(longitude, 2)}"
+           f"&start_date={start_date}&end_date={end_date}")
+    cache_key = url
+
+    with _cache_lock:
+        entry = _cache.get(cache_key)
+        if entry is not None:
+            weather_data, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                _cache.move_to_end(cache_key)
+                return weather_data
+            del _cache[cache_key]
+
+    weather_data = _request_weather_data(url)
+    if weather_data is None: # Failures are never cached
+        return None
 
-    params = {
-        "latitude": latitude, # Corrected typo: latitute -> latitude
-        "longitude": longitude,
-        "start_date": start_date,
-        "end_date": end_date,
-        "daily": ",".join(DAILY_VARIABLES),
-        "timezone": "GMT"
-    }
-
+    expires_at = None if is_range_final(end_date) else time.monotonic() + RECENT_RANGE_TTL_SECONDS
+    with _cache_lock:
+        _cache[cache_key] = (weather_data, expires_at)
+        _cache.move_to_end(cache_key)
+        if len(_cache) > CACHE_MAXSIZE:
+            _cache.popitem(last=False)
+    return weather_data
 
+def _request_weather_data(url):
+    """Performs the Open-Meteo request for a fully built URL. Returns the parsed JSON dict, or None on error."""
     try:
-        response = requests.get(BASE_URL, params=params, timeout=10)
+        response = _CLIENT.get(url)
         response.raise_for_status()
 
         weather_data = response.json()
         return weather_data
 
-    except requests.exceptions.Timeout:
-        print(f"Error: The request to open-meteo timed out. Response was: {response.text}") 
+    except httpx.TimeoutException:
+        print("Error: The request to open-meteo timed out.")
         return None
-    except requests.exceptions.ConnectionError as conn_err:
+    except httpx.ConnectError as conn_err:
         print(f"Error: Could not connect to Open-Meteo. Check your internet connection. Details: {conn_err}")
         return None
-    except requests.exceptions.HTTPError as http_err:
+    except httpx.HTTPStatusError as http_err:
         print(f"HTTP error occurred: {http_err}")
         print(f"Status Code: {response.status_code}")
         print(f"Response content: {response.text}") 
         return None
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching data from Open-Meteo: {e}")
         if 'response' in locals() and response is not None:
              print(f"Response content: {response.text}")
@@ -88,6 +166,7 @@ if __name__ == "__main__":
     print("\n--- Test with invalid parameter (e.g., invalid variable name, should be caught by API) ---")
     original_daily_vars = list(DAILY_VARIABLES)
     DAILY_VARIABLES.append("invalid_variable_name")
+    _STATIC_QUERY = _build_static_query(DAILY_VARIABLES)
     print(f"Fetching data with an invalid variable: {','.join(DAILY_VARIABLES)}")
 
     data_invalid_param = fetch_weather_data(test_latitude, test_longitude, start_date, end_date)
@@ -97,6 +176,7 @@ if __name__ == "__main__":
         print("Unexpectedly got data with invalid parameter:")
         print(json.dumps(data_invalid_param, indent=2))
     DAILY_VARIABLES = original_daily_vars
+    _STATIC_QUERY = _build_static_query(DAILY_VARIABLES)
 
     print("\n--- Test with invalid date (expecting an error from API) ---")
     invalid_start_date = "2023-15-01" # Invalid month
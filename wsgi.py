@@ -0,0 +1,8 @@
+# wsgi.py
+# Gunicorn entrypoint. Patch the standard library before anything else is imported
+# so the sockets used by httpx and the GCS client yield to other greenlets while
+# waiting on Open-Meteo and Cloud Storage.
+from gevent import monkey
+monkey.patch_all()
+
+from app import app # noqa: E402